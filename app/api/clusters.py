@@ -10,7 +10,7 @@ from app.models.cluster import (
     ClusterHealthCheck,
 )
 from app.models.user import UserInDB
-from app.services.cluster_service import cluster_service
+from app.services.cluster_service import cluster_service, CLUSTER_SENSITIVE_FIELDS
 from app.middleware.auth import get_current_active_user, require_admin
 from app.core.database import get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -34,9 +34,7 @@ async def create_cluster(
         )
 
         # Convert to response model (excluding sensitive data)
-        cluster_dict = cluster.model_dump()
-        cluster_dict.pop("encrypted_kube_config", None)
-        cluster_dict.pop("created_by", None)
+        cluster_dict = cluster.model_dump(exclude=CLUSTER_SENSITIVE_FIELDS)
 
         logger.info(
             "Cluster created",
@@ -137,9 +135,7 @@ async def get_cluster(
             )
 
         # Convert to response model (excluding sensitive data)
-        cluster_dict = cluster.model_dump()
-        cluster_dict.pop("encrypted_kube_config", None)
-        cluster_dict.pop("created_by", None)
+        cluster_dict = cluster.model_dump(exclude=CLUSTER_SENSITIVE_FIELDS)
 
         logger.info(
             "Cluster details requested",
@@ -181,9 +177,7 @@ async def update_cluster(
             )
 
         # Convert to response model (excluding sensitive data)
-        cluster_dict = cluster.model_dump()
-        cluster_dict.pop("encrypted_kube_config", None)
-        cluster_dict.pop("created_by", None)
+        cluster_dict = cluster.model_dump(exclude=CLUSTER_SENSITIVE_FIELDS)
 
         logger.info(
             "Cluster updated", cluster_id=cluster_id, updated_by=current_user.username
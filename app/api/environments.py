@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
+from datetime import datetime, timedelta
 import structlog
 
 from app.core.database import get_database
-from app.services.environment_service import environment_service
+from app.services.environment_service import (
+    environment_service,
+    ENVIRONMENT_LIST_PROJECTION,
+)
 from app.models.environment import (
     EnvironmentCreate,
     EnvironmentResponse,
@@ -18,6 +22,11 @@ from app.core.logging import audit_log
 logger = structlog.get_logger(__name__)
 router = APIRouter()
 
+# Metrics documents fetched per cursor round-trip
+METRICS_BATCH_SIZE = 1000
+# Maximum metrics samples returned per request
+METRICS_MAX_SAMPLES = 10000
+
 
 @router.post(
     "/", response_model=EnvironmentResponse, status_code=status.HTTP_201_CREATED
@@ -85,15 +94,13 @@ async def list_environments(
     try:
         environment_service.set_database(db)
 
-        # Get user environments
+        # Get user environments, filtered by status on the server
         environments = await environment_service.get_user_environments(
-            str(current_user.id)
+            str(current_user.id),
+            projection=ENVIRONMENT_LIST_PROJECTION,
+            status_filter=status_filter,
         )
 
-        # Filter by status if provided
-        if status_filter:
-            environments = [env for env in environments if env.status == status_filter]
-
         # Convert to response models
         response = []
         for env in environments:
@@ -306,17 +313,21 @@ async def get_environment_metrics(
             )
 
         # Get metrics from database (last N hours)
-        from datetime import datetime, timedelta
-
         since = datetime.utcnow() - timedelta(hours=hours)
 
-        cursor = db.environment_metrics.find(
-            {"environment_id": environment_id, "timestamp": {"$gte": since}}
-        ).sort("timestamp", 1)
-
-        metrics = []
-        async for metric_doc in cursor:
-            metrics.append(EnvironmentMetrics(**metric_doc))
+        # Newest first so the cap keeps the most recent samples
+        cursor = (
+            db.environment_metrics.find(
+                {"environment_id": environment_id, "timestamp": {"$gte": since}}
+            )
+            .sort("timestamp", -1)
+            .limit(METRICS_MAX_SAMPLES)
+            .batch_size(METRICS_BATCH_SIZE)
+        )
+        metric_docs = await cursor.to_list(length=METRICS_MAX_SAMPLES)
+        metrics = [
+            EnvironmentMetrics(**metric_doc) for metric_doc in reversed(metric_docs)
+        ]
 
         return {"environment_id": environment_id, "metrics": metrics}
 
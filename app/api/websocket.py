@@ -24,6 +24,30 @@ logger = structlog.get_logger(__name__)
 router = APIRouter()
 
 
+def _simulated_log_message(message: str) -> str:
+    """Serialize a simulated log entry"""
+    return json.dumps(
+        {
+            "type": "log",
+            "timestamp": "2024-01-01T12:00:00Z",
+            "level": "info",
+            "message": message,
+        }
+    )
+
+
+# Simulated log stream, serialized once at import
+INITIAL_LOG_MESSAGES = tuple(
+    _simulated_log_message(log_line)
+    for log_line in (
+        "2024-01-01 12:00:00 [INFO] Environment starting...",
+        "2024-01-01 12:00:01 [INFO] Container initialized",
+        "2024-01-01 12:00:02 [INFO] Ready for connections",
+    )
+)
+HEARTBEAT_LOG_MESSAGE = _simulated_log_message("Heartbeat - system running normally")
+
+
 class WebSocketConnectionManager:
     """Manages WebSocket connections"""
 
@@ -278,24 +302,8 @@ async def websocket_logs(
         logger.info(f"Logs WebSocket connected for environment {environment_id}")
 
         # Send initial logs (simulated)
-        initial_logs = [
-            "2024-01-01 12:00:00 [INFO] Environment starting...",
-            "2024-01-01 12:00:01 [INFO] Container initialized",
-            "2024-01-01 12:00:02 [INFO] Ready for connections",
-        ]
-
-        for log_line in initial_logs:
-            await connection_manager.send_personal_message(
-                json.dumps(
-                    {
-                        "type": "log",
-                        "timestamp": "2024-01-01T12:00:00Z",
-                        "level": "info",
-                        "message": log_line,
-                    }
-                ),
-                connection_id,
-            )
+        for log_message in INITIAL_LOG_MESSAGES:
+            await connection_manager.send_personal_message(log_message, connection_id)
 
         if follow:
             # Keep connection alive and simulate new logs
@@ -307,15 +315,7 @@ async def websocket_logs(
 
                 # Simulate a new log entry
                 await connection_manager.send_personal_message(
-                    json.dumps(
-                        {
-                            "type": "log",
-                            "timestamp": "2024-01-01T12:00:00Z",
-                            "level": "info",
-                            "message": "Heartbeat - system running normally",
-                        }
-                    ),
-                    connection_id,
+                    HEARTBEAT_LOG_MESSAGE, connection_id
                 )
         else:
             # Just send logs and close
@@ -20,6 +20,10 @@ class Settings(BaseSettings):
     # Database settings
     MONGODB_URL: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "devpocket"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+    MONGODB_MAX_CONNECTING: int = 4
 
     # Google OAuth settings
     GOOGLE_CLIENT_ID: Optional[str] = None
@@ -43,6 +47,7 @@ class Settings(BaseSettings):
     CONTAINER_CPU_LIMIT: str = "1000m"
     CONTAINER_MEMORY_LIMIT: str = "2Gi"
     CONTAINER_STORAGE_LIMIT: str = "10Gi"
+    CONTAINER_MAX_CONCURRENT_OPERATIONS: int = 10
 
     # Redis settings
     REDIS_URL: str = "redis://localhost:6379"
@@ -1,4 +1,7 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+from pymongo.errors import CollectionInvalid
 from pymongo.server_api import ServerApi
 from app.core.config import settings
 import logging
@@ -19,6 +22,40 @@ class Database:
 
 db = Database()
 
+# Application indexes, grouped by collection
+COLLECTION_INDEXES = {
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("username", unique=True),
+        IndexModel("google_id"),
+    ],
+    "environments": [
+        IndexModel("user_id"),
+        IndexModel([("user_id", 1), ("status", 1)]),
+        IndexModel("created_at"),
+    ],
+    "sessions": [
+        IndexModel("user_id"),
+        IndexModel("environment_id"),
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "websocket_sessions": [
+        IndexModel("connection_id", unique=True),
+        IndexModel([("user_id", 1), ("environment_id", 1)]),
+    ],
+    "environment_metrics": [
+        IndexModel([("environment_id", 1), ("timestamp", -1)]),
+    ],
+    "clusters": [
+        IndexModel("name", unique=True),
+        IndexModel([("region", 1), ("is_default", 1)]),
+        IndexModel([("region", 1), ("created_at", -1)]),
+        IndexModel([("created_at", -1)]),
+        IndexModel("status"),
+        IndexModel("created_by"),
+    ],
+}
+
 
 async def connect_to_mongo():
     """Create database connection"""
@@ -26,8 +63,10 @@ async def connect_to_mongo():
         db.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             server_api=ServerApi("1"),
-            maxPoolSize=10,
-            minPoolSize=10,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+            maxConnecting=settings.MONGODB_MAX_CONNECTING,
         )
 
         # Test connection
@@ -38,7 +77,8 @@ async def connect_to_mongo():
         logger.info(f"Connected to MongoDB at {settings.MONGODB_URL}")
         logger.info(f"Using database: {settings.DATABASE_NAME}")
 
-        # Create indexes
+        # Create collections and indexes
+        await create_collections()
         await create_indexes()
 
     except Exception as e:
@@ -56,34 +96,54 @@ async def close_mongo_connection():
         logger.error(f"Error closing MongoDB connection: {e}")
 
 
-async def create_indexes():
-    """Create database indexes for optimal performance"""
+async def create_collections():
+    """Create collections that need explicit options"""
     try:
-        # Users collection indexes
-        await db.database.users.create_index("email", unique=True)
-        await db.database.users.create_index("username", unique=True)
-        await db.database.users.create_index("google_id")
-
-        # Environments collection indexes
-        await db.database.environments.create_index("user_id")
-        await db.database.environments.create_index([("user_id", 1), ("status", 1)])
-        await db.database.environments.create_index("created_at")
-
-        # Sessions collection indexes
-        await db.database.sessions.create_index("user_id")
-        await db.database.sessions.create_index("environment_id")
-        await db.database.sessions.create_index("expires_at", expireAfterSeconds=0)
-
-        # Clusters collection indexes
-        await db.database.clusters.create_index("name", unique=True)
-        await db.database.clusters.create_index([("region", 1), ("is_default", 1)])
-        await db.database.clusters.create_index("status")
-        await db.database.clusters.create_index("created_by")
-
-        logger.info("Database indexes created successfully")
+        # Metrics are append-only samples, stored as a time-series collection
+        await db.database.create_collection(
+            "environment_metrics",
+            timeseries={
+                "timeField": "timestamp",
+                "metaField": "environment_id",
+                "granularity": "seconds",
+            },
+            expireAfterSeconds=2592000,  # 30 days retention
+        )
+        logger.info("Created time-series collection: environment_metrics")
 
+    except CollectionInvalid:
+        # Collection already exists
+        pass
     except Exception as e:
-        logger.error(f"Error creating indexes: {e}")
+        logger.error(f"Error creating collections: {e}")
+
+
+async def create_indexes(database=None):
+    """Create database indexes for optimal performance
+
+    Uses the application database unless another one is passed in.
+    """
+    if database is None:
+        database = db.database
+
+    # One createIndexes command per collection, all collections concurrently
+    collections = list(COLLECTION_INDEXES)
+    results = await asyncio.gather(
+        *(
+            database[name].create_indexes(COLLECTION_INDEXES[name])
+            for name in collections
+        ),
+        return_exceptions=True,
+    )
+
+    failed = False
+    for name, result in zip(collections, results):
+        if isinstance(result, Exception):
+            failed = True
+            logger.error(f"Error creating indexes for {name}: {result}")
+
+    if not failed:
+        logger.info("Database indexes created successfully")
 
 
 def get_database():
@@ -5,6 +5,7 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from app.core.config import settings
 import logging
+import secrets
 
 logger = logging.getLogger(__name__)
 
@@ -93,8 +94,6 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
 
 def generate_api_key() -> str:
     """Generate a secure API key for external integrations"""
-    import secrets
-
     return f"dpk_{secrets.token_urlsafe(32)}"
 
 
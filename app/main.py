@@ -8,10 +8,11 @@ import time
 import structlog
 
 from app.core.config import settings
-from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.database import db, connect_to_mongo, close_mongo_connection
 from app.core.logging import configure_logging
 from app.core.security import SecurityHeaders
 from app.middleware.rate_limiting import RateLimitMiddleware
+from app.services.environment_service import environment_service
 from app.api import auth, environments, websocket, clusters
 
 # Configure logging
@@ -35,6 +36,11 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down DevPocket API server")
+    await environment_service.close_metrics()
+    if environment_service.active_sessions:
+        await environment_service.remove_websocket_sessions(
+            list(environment_service.active_sessions)
+        )
     await close_mongo_connection()
     logger.info("Database connection closed")
 
@@ -196,8 +202,6 @@ async def health_check():
 async def readiness_check():
     """Readiness check for Kubernetes"""
     try:
-        from app.core.database import db
-
         # Check database connection
         await db.client.admin.command("ping")
 
@@ -47,6 +47,10 @@ class EnvironmentTemplate(str, Enum):
     CUSTOM = "custom"
 
 
+# Binary units accepted for memory and storage quantities
+MEMORY_STORAGE_UNITS = ("Ki", "Mi", "Gi", "Ti")
+
+
 class ResourceLimits(BaseModel):
     cpu: str = "500m"  # 500 millicores
     memory: str = "1Gi"  # 1 Gigabyte
@@ -64,11 +68,13 @@ class ResourceLimits(BaseModel):
     @field_validator("memory", "storage")
     @classmethod
     def validate_memory_storage(cls, v):
-        valid_units = ["Ki", "Mi", "Gi", "Ti"]
-        if not any(v.endswith(unit) for unit in valid_units):
+        if not v.endswith(MEMORY_STORAGE_UNITS):
             raise ValueError("Memory/Storage must end with Ki, Mi, Gi, or Ti")
         return v
 
+    class Config:
+        frozen = True
+
 
 class EnvironmentCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
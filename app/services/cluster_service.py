@@ -1,11 +1,12 @@
+import asyncio
 import base64
+import time
 import yaml
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from cryptography.fernet import Fernet
-from kubernetes import client, config
-from kubernetes.config import ConfigException
 import structlog
 
 from app.models.cluster import (
@@ -21,6 +22,26 @@ from app.core.config import settings
 
 logger = structlog.get_logger()
 
+# How long a parsed kubeconfig is reused before it is decrypted again
+KUBECONFIG_CACHE_TTL = 300  # seconds
+
+# Sensitive cluster fields never returned to clients
+CLUSTER_SENSITIVE_FIELDS = frozenset({"encrypted_kube_config", "created_by"})
+
+# Listings exclude the sensitive fields server-side
+CLUSTER_LIST_PROJECTION = {field: 0 for field in CLUSTER_SENSITIVE_FIELDS}
+
+
+def _parse_kubeconfig(kube_config: str) -> Dict[str, Any]:
+    """Decode a base64 kubeconfig and parse its YAML"""
+    return yaml.safe_load(base64.b64decode(kube_config).decode("utf-8"))
+
+
+async def parse_kubeconfig(kube_config: str) -> Dict[str, Any]:
+    """Decode and parse a kubeconfig in the default executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _parse_kubeconfig, kube_config)
+
 
 class ClusterService:
     def __init__(self):
@@ -28,6 +49,8 @@ class ClusterService:
         # Generate or load encryption key for kube_config
         self.encryption_key = settings.SECRET_KEY[:32].ljust(32, "0").encode()[:32]
         self.cipher_suite = Fernet(base64.urlsafe_b64encode(self.encryption_key))
+        # cluster_id -> (expires_at, parsed kubeconfig)
+        self._kubeconfig_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
     def set_database(self, database: AsyncIOMotorDatabase):
         self.db = database
@@ -36,15 +59,12 @@ class ClusterService:
         self, cluster_data: ClusterCreate, created_by: str
     ) -> ClusterInDB:
         """Create a new cluster configuration"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         # Validate kubeconfig
         try:
-            kube_config_yaml = base64.b64decode(cluster_data.kube_config).decode(
-                "utf-8"
-            )
-            config_dict = yaml.safe_load(kube_config_yaml)
+            config_dict = await parse_kubeconfig(cluster_data.kube_config)
 
             # Basic validation of kubeconfig structure
             required_keys = ["clusters", "contexts", "users"]
@@ -55,18 +75,6 @@ class ClusterService:
             logger.error("Invalid kubeconfig provided", error=str(e))
             raise ValueError(f"Invalid kubeconfig: {str(e)}")
 
-        # Check if cluster name already exists
-        existing_cluster = await self.db.clusters.find_one({"name": cluster_data.name})
-        if existing_cluster:
-            raise ValueError(f"Cluster with name '{cluster_data.name}' already exists")
-
-        # If this is set as default, unset other defaults in the same region
-        if cluster_data.is_default:
-            await self.db.clusters.update_many(
-                {"region": cluster_data.region, "is_default": True},
-                {"$set": {"is_default": False, "updated_at": datetime.utcnow()}},
-            )
-
         # Encrypt the kubeconfig
         encrypted_config = self.cipher_suite.encrypt(
             cluster_data.kube_config.encode()
@@ -85,8 +93,23 @@ class ClusterService:
             }
         )
 
-        result = await self.db.clusters.insert_one(cluster_dict)
-        cluster_dict["_id"] = result.inserted_id
+        # The unique name index rejects duplicates without a prior lookup
+        try:
+            result = await self.db.clusters.insert_one(cluster_dict)
+        except DuplicateKeyError:
+            raise ValueError(f"Cluster with name '{cluster_data.name}' already exists")
+        cluster_dict["_id"] = str(result.inserted_id)
+
+        # If this is set as default, unset other defaults in the same region
+        if cluster_data.is_default:
+            await self.db.clusters.update_many(
+                {
+                    "region": cluster_data.region,
+                    "is_default": True,
+                    "_id": {"$ne": result.inserted_id},
+                },
+                {"$set": {"is_default": False, "updated_at": datetime.utcnow()}},
+            )
 
         logger.info(
             "Cluster created successfully",
@@ -97,7 +120,7 @@ class ClusterService:
 
     async def get_cluster_by_id(self, cluster_id: str) -> Optional[ClusterInDB]:
         """Get cluster by ID"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         cluster_data = await self.db.clusters.find_one({"_id": cluster_id})
@@ -109,7 +132,7 @@ class ClusterService:
         self, region: ClusterRegion
     ) -> Optional[ClusterInDB]:
         """Get the default cluster for a region"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         # First try to get the default cluster for the region
@@ -131,30 +154,29 @@ class ClusterService:
         self, region: Optional[ClusterRegion] = None
     ) -> List[ClusterResponse]:
         """List all clusters, optionally filtered by region"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         query = {}
         if region:
             query["region"] = region
 
-        cursor = self.db.clusters.find(query).sort("created_at", -1)
-        clusters = []
+        # Encrypted config and creator are excluded server-side
+        cursor = self.db.clusters.find(query, CLUSTER_LIST_PROJECTION).sort(
+            "created_at", -1
+        )
+        cluster_docs = await cursor.to_list(length=None)
 
-        async for cluster_data in cursor:
-            # Remove encrypted config from response
-            cluster_dict = dict(cluster_data)
-            cluster_dict.pop("encrypted_kube_config", None)
-            cluster_dict.pop("created_by", None)
-            clusters.append(ClusterResponse(**cluster_dict))
+        for cluster_data in cluster_docs:
+            cluster_data["id"] = str(cluster_data.pop("_id"))
 
-        return clusters
+        return [ClusterResponse.model_validate(doc) for doc in cluster_docs]
 
     async def update_cluster(
         self, cluster_id: str, update_data: ClusterUpdate
     ) -> Optional[ClusterInDB]:
         """Update cluster configuration"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         update_dict = {
@@ -167,10 +189,7 @@ class ClusterService:
         # Handle kubeconfig update
         if "kube_config" in update_dict:
             try:
-                kube_config_yaml = base64.b64decode(update_dict["kube_config"]).decode(
-                    "utf-8"
-                )
-                yaml.safe_load(kube_config_yaml)  # Validate YAML
+                await parse_kubeconfig(update_dict["kube_config"])  # Validate YAML
 
                 # Encrypt the new config
                 encrypted_config = self.cipher_suite.encrypt(
@@ -196,6 +215,8 @@ class ClusterService:
         result = await self.db.clusters.update_one(
             {"_id": cluster_id}, {"$set": update_dict}
         )
+        # Invalidate after the write so a concurrent read can't re-cache stale data
+        self._kubeconfig_cache.pop(cluster_id, None)
 
         if result.modified_count > 0:
             return await self.get_cluster_by_id(cluster_id)
@@ -203,7 +224,7 @@ class ClusterService:
 
     async def delete_cluster(self, cluster_id: str) -> bool:
         """Delete a cluster (only if no environments are using it)"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         cluster = await self.get_cluster_by_id(cluster_id)
@@ -220,11 +241,12 @@ class ClusterService:
             )
 
         result = await self.db.clusters.delete_one({"_id": cluster_id})
+        self._kubeconfig_cache.pop(cluster_id, None)
         return result.deleted_count > 0
 
     async def get_decrypted_kubeconfig(self, cluster_id: str) -> Optional[str]:
         """Get decrypted kubeconfig for internal use"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
         cluster_data = await self.db.clusters.find_one({"_id": cluster_id})
@@ -245,6 +267,23 @@ class ClusterService:
 
         return None
 
+    async def get_kubeconfig_dict(self, cluster_id: str) -> Optional[Dict[str, Any]]:
+        """Get parsed kubeconfig for a cluster, cached for KUBECONFIG_CACHE_TTL"""
+        cached = self._kubeconfig_cache.get(cluster_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        kubeconfig = await self.get_decrypted_kubeconfig(cluster_id)
+        if not kubeconfig:
+            return None
+
+        config_dict = await parse_kubeconfig(kubeconfig)
+        self._kubeconfig_cache[cluster_id] = (
+            time.monotonic() + KUBECONFIG_CACHE_TTL,
+            config_dict,
+        )
+        return config_dict
+
     async def check_cluster_health(self, cluster_id: str) -> ClusterHealthCheck:
         """Check cluster health and connectivity"""
         cluster = await self.get_cluster_by_id(cluster_id)
@@ -263,15 +302,12 @@ class ClusterService:
         )
 
         try:
-            # Get kubeconfig and test connection
-            kubeconfig = await self.get_decrypted_kubeconfig(cluster_id)
-            if not kubeconfig:
+            # Get parsed kubeconfig and test connection
+            config_dict = await self.get_kubeconfig_dict(cluster_id)
+            if not config_dict:
                 health_check.error_message = "Failed to decrypt kubeconfig"
                 return health_check
 
-            # Load kubeconfig from string
-            config_dict = yaml.safe_load(base64.b64decode(kubeconfig).decode("utf-8"))
-
             # Test connection (this would need actual kubernetes client setup)
             # For now, we'll just validate the config structure
             start_time = datetime.utcnow()
@@ -320,19 +356,29 @@ class ClusterService:
 
     async def get_available_regions(self) -> List[Dict[str, Any]]:
         """Get list of available regions with their cluster status"""
-        if not self.db:
+        if self.db is None:
             raise ValueError("Database not initialized")
 
+        # Count active clusters and detect defaults for every region at once
+        region_stats = await self.db.clusters.aggregate(
+            [
+                {"$match": {"status": ClusterStatus.ACTIVE}},
+                {
+                    "$group": {
+                        "_id": "$region",
+                        "cluster_count": {"$sum": 1},
+                        "has_default": {"$max": {"$eq": ["$is_default", True]}},
+                    }
+                },
+            ]
+        ).to_list(length=None)
+        stats_by_region = {stats["_id"]: stats for stats in region_stats}
+
         regions_info = []
 
         for region in ClusterRegion:
-            cluster_count = await self.db.clusters.count_documents(
-                {"region": region, "status": ClusterStatus.ACTIVE}
-            )
-
-            default_cluster = await self.db.clusters.find_one(
-                {"region": region, "is_default": True, "status": ClusterStatus.ACTIVE}
-            )
+            stats = stats_by_region.get(region.value, {})
+            cluster_count = stats.get("cluster_count", 0)
 
             regions_info.append(
                 {
@@ -340,7 +386,7 @@ class ClusterService:
                     "display_name": region.value.replace("-", " ").title(),
                     "cluster_count": cluster_count,
                     "available": cluster_count > 0,
-                    "has_default": default_cluster is not None,
+                    "has_default": stats.get("has_default", False),
                 }
             )
 
@@ -1,8 +1,13 @@
 import asyncio
-import uuid
+import secrets
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Set, Coroutine, Tuple
+from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import structlog
 
 from app.core.config import settings
@@ -19,6 +24,51 @@ from app.models.user import UserInDB
 
 logger = structlog.get_logger(__name__)
 
+# Metrics are buffered in memory and written in batches
+METRICS_FLUSH_INTERVAL = 1.0  # seconds
+METRICS_FLUSH_BATCH_SIZE = 500
+# Cap on buffered samples kept for retry while the database is unavailable
+METRICS_BUFFER_MAX_SIZE = 10 * METRICS_FLUSH_BATCH_SIZE
+
+# Short-lived cache for get_environment, absorbs WebSocket reconnect bursts
+ENVIRONMENT_CACHE_TTL = 2.0  # seconds
+ENVIRONMENT_CACHE_MAX_SIZE = 4096
+
+# Maximum active environments per subscription plan
+PLAN_ENVIRONMENT_LIMITS = MappingProxyType(
+    {"free": 1, "starter": 3, "pro": 10, "admin": 100}
+)
+
+# Default resource limits per subscription plan
+RESOURCE_PRESETS = MappingProxyType(
+    {
+        "free": ResourceLimits(cpu="500m", memory="1Gi", storage="5Gi"),
+        "starter": ResourceLimits(cpu="1000m", memory="2Gi", storage="10Gi"),
+        "pro": ResourceLimits(cpu="2000m", memory="4Gi", storage="20Gi"),
+        "admin": ResourceLimits(cpu="4000m", memory="8Gi", storage="50Gi"),
+    }
+)
+
+# Fields not rendered by list views (all have defaults on EnvironmentInDB)
+ENVIRONMENT_LIST_PROJECTION = {
+    "environment_variables": 0,
+    "container_id": 0,
+    "namespace": 0,
+    "pod_name": 0,
+    "service_name": 0,
+    "internal_url": 0,
+    "ssh_port": 0,
+}
+
+# Maximum connection ids per $in filter when removing sessions in bulk
+SESSION_DELETE_BATCH_SIZE = 100
+
+# Fields returned from status transitions; callers only log the name
+TRANSITION_PROJECTION = {"name": 1, "status": 1}
+
+# Statuses that count towards a user's environment limit
+ACTIVE_STATUSES = (EnvironmentStatus.CREATING.value, EnvironmentStatus.RUNNING.value)
+
 
 class EnvironmentService:
     """Service for managing development environments (containers/pods)"""
@@ -26,11 +76,48 @@ class EnvironmentService:
     def __init__(self):
         self.db = None
         self.active_sessions: Dict[str, WebSocketSession] = {}
+        self._metrics_buffer: List[Dict[str, Any]] = []
+        self._metrics_flush_task: Optional[asyncio.Task] = None
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._container_semaphore = asyncio.Semaphore(
+            settings.CONTAINER_MAX_CONCURRENT_OPERATIONS
+        )
+        # (env_id, user_id) -> (expires_at, environment)
+        self._environment_cache: Dict[
+            Tuple[str, str], Tuple[float, EnvironmentInDB]
+        ] = {}
 
     def set_database(self, db):
         """Set database instance"""
         self.db = db
 
+    def _to_environment(self, env_doc: Dict[str, Any]) -> EnvironmentInDB:
+        """Validate an environment document from MongoDB"""
+        env_doc["_id"] = str(env_doc["_id"])
+        return EnvironmentInDB.model_validate(env_doc)
+
+    def _cache_environment(self, environment: EnvironmentInDB):
+        """Cache an environment for ENVIRONMENT_CACHE_TTL seconds"""
+        if len(self._environment_cache) >= ENVIRONMENT_CACHE_MAX_SIZE:
+            # Evict the oldest entry (dicts preserve insertion order)
+            self._environment_cache.pop(next(iter(self._environment_cache)))
+
+        self._environment_cache[(str(environment.id), environment.user_id)] = (
+            time.monotonic() + ENVIRONMENT_CACHE_TTL,
+            environment,
+        )
+
+    def _invalidate_environment(self, env_id: Any, user_id: str):
+        """Drop a cached environment after its state changed"""
+        self._environment_cache.pop((str(env_id), user_id), None)
+
+    def _run_in_background(self, coro: Coroutine) -> asyncio.Task:
+        """Schedule a background task and keep a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
     async def create_environment(
         self, user: UserInDB, env_data: EnvironmentCreate
     ) -> EnvironmentInDB:
@@ -42,43 +129,52 @@ class EnvironmentService:
             # Set default resources based on subscription
             resources = env_data.resources or self._get_default_resources(user)
 
+            user_id = str(user.id)
+            now = datetime.utcnow()
+
             # Generate unique names
-            namespace = f"user-{str(user.id)}"
-            pod_name = f"{env_data.name}-{uuid.uuid4().hex[:8]}"
+            namespace = f"user-{user_id}"
+            pod_name = f"{env_data.name}-{secrets.token_hex(4)}"
             service_name = f"svc-{pod_name}"
 
             # Create environment document
-            environment = EnvironmentInDB(
-                user_id=str(user.id),
-                name=env_data.name,
-                template=env_data.template,
-                status=EnvironmentStatus.CREATING,
-                resources=resources,
-                environment_variables=env_data.environment_variables or {},
-                namespace=namespace,
-                pod_name=pod_name,
-                service_name=service_name,
-            )
+            env_dict = {
+                "user_id": user_id,
+                "name": env_data.name,
+                "template": env_data.template,
+                "status": EnvironmentStatus.CREATING,
+                "resources": resources.model_dump(),
+                "environment_variables": env_data.environment_variables or {},
+                "namespace": namespace,
+                "pod_name": pod_name,
+                "service_name": service_name,
+                "created_at": now,
+                "updated_at": now,
+            }
 
             # Save to database
-            env_dict = environment.dict(by_alias=True)
-            env_dict.pop("id", None)  # Remove id for insert
-
             result = await self.db.environments.insert_one(env_dict)
-            environment.id = result.inserted_id
+            env_oid = result.inserted_id
+
+            # Inputs are already validated, so skip a second validation pass
+            environment = EnvironmentInDB.model_construct(
+                **{**env_dict, "_id": str(env_oid), "resources": resources}
+            )
 
             # Create the actual container/pod (async)
-            asyncio.create_task(self._create_container(environment))
+            self._run_in_background(self._create_container(environment, env_oid))
 
             logger.info(
-                f"Environment creation started: {env_data.name} for user {user.username}"
+                "Environment creation started",
+                environment_name=env_data.name,
+                username=user.username,
             )
             return environment
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error creating environment: {e}")
+            logger.error("Error creating environment", error=str(e))
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Could not create environment",
@@ -86,15 +182,14 @@ class EnvironmentService:
 
     async def _check_user_limits(self, user: UserInDB):
         """Check if user can create more environments"""
-        # Count user's active environments
-        active_count = await self.db.environments.count_documents(
-            {"user_id": str(user.id), "status": {"$in": ["creating", "running"]}}
-        )
-
         # Set limits based on subscription
-        limits = {"free": 1, "starter": 3, "pro": 10, "admin": 100}
+        max_environments = PLAN_ENVIRONMENT_LIMITS.get(user.subscription_plan, 1)
 
-        max_environments = limits.get(user.subscription_plan, 1)
+        # Count user's active environments, stopping once the limit is reached
+        active_count = await self.db.environments.count_documents(
+            {"user_id": str(user.id), "status": {"$in": ACTIVE_STATUSES}},
+            limit=max_environments,
+        )
 
         if active_count >= max_environments:
             raise HTTPException(
@@ -104,84 +199,85 @@ class EnvironmentService:
 
     def _get_default_resources(self, user: UserInDB) -> ResourceLimits:
         """Get default resource limits based on user subscription"""
-        resource_presets = {
-            "free": ResourceLimits(cpu="500m", memory="1Gi", storage="5Gi"),
-            "starter": ResourceLimits(cpu="1000m", memory="2Gi", storage="10Gi"),
-            "pro": ResourceLimits(cpu="2000m", memory="4Gi", storage="20Gi"),
-            "admin": ResourceLimits(cpu="4000m", memory="8Gi", storage="50Gi"),
-        }
-
-        return resource_presets.get(user.subscription_plan, resource_presets["free"])
+        return RESOURCE_PRESETS.get(user.subscription_plan, RESOURCE_PRESETS["free"])
 
-    async def _create_container(self, environment: EnvironmentInDB):
+    async def _create_container(self, environment: EnvironmentInDB, env_oid: ObjectId):
         """Create the actual container/pod (simulated)"""
-        try:
-            # Update status to creating
-            await self.db.environments.update_one(
-                {"_id": environment.id},
-                {"$set": {"status": EnvironmentStatus.CREATING.value}},
-            )
-
-            # Simulate container creation process
-            await asyncio.sleep(10)  # Simulated creation time
-
-            # In a real implementation, this would:
-            # 1. Create Kubernetes namespace
-            # 2. Create persistent volume claim
-            # 3. Create deployment with appropriate image
-            # 4. Create service for networking
-            # 5. Set up ingress for external access
-
-            # For now, simulate success
-            external_url = f"https://env-{environment.pod_name}.devpocket.io"
-            web_port = 8080
-            ssh_port = 2222
-
-            # Update environment with created resources
-            await self.db.environments.update_one(
-                {"_id": environment.id},
-                {
-                    "$set": {
-                        "status": EnvironmentStatus.RUNNING.value,
-                        "external_url": external_url,
-                        "web_port": web_port,
-                        "ssh_port": ssh_port,
-                        "updated_at": datetime.utcnow(),
-                    }
-                },
-            )
-
-            logger.info(f"Environment created successfully: {environment.name}")
+        # Bound concurrent provisioning so bursts don't overload the cluster API
+        async with self._container_semaphore:
+            try:
+                # Simulate container creation process
+                await asyncio.sleep(10)  # Simulated creation time
+
+                # In a real implementation, this would:
+                # 1. Create Kubernetes namespace
+                # 2. Create persistent volume claim
+                # 3. Create deployment with appropriate image
+                # 4. Create service for networking
+                # 5. Set up ingress for external access
+
+                # For now, simulate success
+                external_url = f"https://env-{environment.pod_name}.devpocket.io"
+                web_port = 8080
+                ssh_port = 2222
+
+                # Update environment with created resources
+                await self.db.environments.update_one(
+                    {"_id": env_oid},
+                    {
+                        "$set": {
+                            "status": EnvironmentStatus.RUNNING.value,
+                            "external_url": external_url,
+                            "web_port": web_port,
+                            "ssh_port": ssh_port,
+                            "updated_at": datetime.utcnow(),
+                        }
+                    },
+                )
 
-        except Exception as e:
-            logger.error(
-                f"Error creating container for environment {environment.id}: {e}"
-            )
+                self._invalidate_environment(environment.id, environment.user_id)
+                logger.info(
+                    "Environment created successfully",
+                    environment_name=environment.name,
+                )
 
-            # Update status to error
-            await self.db.environments.update_one(
-                {"_id": environment.id},
-                {
-                    "$set": {
-                        "status": EnvironmentStatus.ERROR.value,
-                        "updated_at": datetime.utcnow(),
-                    }
-                },
-            )
+            except Exception as e:
+                logger.error(
+                    "Error creating container",
+                    environment_id=str(environment.id),
+                    error=str(e),
+                )
 
-    async def get_user_environments(self, user_id: str) -> List[EnvironmentInDB]:
-        """Get all environments for a user"""
+                # Update status to error
+                await self.db.environments.update_one(
+                    {"_id": env_oid},
+                    {
+                        "$set": {
+                            "status": EnvironmentStatus.ERROR.value,
+                            "updated_at": datetime.utcnow(),
+                        }
+                    },
+                )
+                self._invalidate_environment(environment.id, environment.user_id)
+
+    async def get_user_environments(
+        self,
+        user_id: str,
+        projection: Optional[Dict[str, Any]] = None,
+        status_filter: Optional[EnvironmentStatus] = None,
+    ) -> List[EnvironmentInDB]:
+        """Get all environments for a user, optionally by status and projected"""
         try:
-            cursor = self.db.environments.find({"user_id": user_id})
-            environments = []
-
-            async for env_doc in cursor:
-                environments.append(EnvironmentInDB(**env_doc))
+            query: Dict[str, Any] = {"user_id": user_id}
+            if status_filter:
+                query["status"] = status_filter.value
 
-            return environments
+            cursor = self.db.environments.find(query, projection)
+            env_docs = await cursor.to_list(length=None)
+            return [self._to_environment(env_doc) for env_doc in env_docs]
 
         except Exception as e:
-            logger.error(f"Error getting user environments: {e}")
+            logger.error("Error getting user environments", error=str(e))
             return []
 
     async def get_environment(
@@ -189,48 +285,64 @@ class EnvironmentService:
     ) -> Optional[EnvironmentInDB]:
         """Get specific environment for user"""
         try:
+            cached = self._environment_cache.get((str(env_id), user_id))
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
             env_doc = await self.db.environments.find_one(
                 {"_id": env_id, "user_id": user_id}
             )
 
             if env_doc:
-                return EnvironmentInDB(**env_doc)
+                environment = self._to_environment(env_doc)
+                self._cache_environment(environment)
+                return environment
             return None
 
         except Exception as e:
-            logger.error(f"Error getting environment: {e}")
+            logger.error("Error getting environment", error=str(e))
             return None
 
     async def delete_environment(self, env_id: str, user_id: str) -> bool:
         """Delete an environment"""
         try:
-            # Get environment first
-            environment = await self.get_environment(env_id, user_id)
-            if not environment:
+            # Mark as terminating and fetch the environment in one round-trip
+            env_doc = await self.db.environments.find_one_and_update(
+                {"_id": env_id, "user_id": user_id},
+                {
+                    "$set": {
+                        "status": EnvironmentStatus.TERMINATED.value,
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+            if not env_doc:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Environment not found",
                 )
 
-            # Update status to terminating
-            await self.db.environments.update_one(
-                {"_id": env_id},
-                {"$set": {"status": EnvironmentStatus.TERMINATED.value}},
-            )
+            # Keep the stored ObjectId; _to_environment stringifies the id
+            env_oid = env_doc["_id"]
+            self._invalidate_environment(env_id, user_id)
+            environment = self._to_environment(env_doc)
 
             # Delete the actual container/pod (async)
-            asyncio.create_task(self._delete_container(environment))
+            self._run_in_background(self._delete_container(environment, env_oid))
 
-            logger.info(f"Environment deletion started: {environment.name}")
+            logger.info(
+                "Environment deletion started", environment_name=environment.name
+            )
             return True
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error deleting environment: {e}")
+            logger.error("Error deleting environment", error=str(e))
             return False
 
-    async def _delete_container(self, environment: EnvironmentInDB):
+    async def _delete_container(self, environment: EnvironmentInDB, env_oid: ObjectId):
         """Delete the actual container/pod (simulated)"""
         try:
             # Simulate deletion time
@@ -243,67 +355,95 @@ class EnvironmentService:
             # 4. Clean up namespace if empty
 
             # Remove from database
-            await self.db.environments.delete_one({"_id": environment.id})
+            await self.db.environments.delete_one({"_id": env_oid})
+            self._invalidate_environment(environment.id, environment.user_id)
 
-            logger.info(f"Environment deleted successfully: {environment.name}")
+            logger.info(
+                "Environment deleted successfully", environment_name=environment.name
+            )
 
         except Exception as e:
             logger.error(
-                f"Error deleting container for environment {environment.id}: {e}"
+                "Error deleting container",
+                environment_id=str(environment.id),
+                error=str(e),
             )
 
+    async def _transition_status(
+        self,
+        env_id: str,
+        user_id: str,
+        from_status: EnvironmentStatus,
+        to_status: EnvironmentStatus,
+    ) -> Optional[Dict[str, Any]]:
+        """Atomically move an environment from one status to another.
+
+        Returns the updated document (name and status only), or None if the
+        environment does not exist or is not in ``from_status``.
+        """
+        env_doc = await self.db.environments.find_one_and_update(
+            {"_id": env_id, "user_id": user_id, "status": from_status.value},
+            {"$set": {"status": to_status.value, "updated_at": datetime.utcnow()}},
+            projection=TRANSITION_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if env_doc:
+            self._invalidate_environment(env_id, user_id)
+        return env_doc
+
+    async def _environment_exists(self, env_id: str, user_id: str) -> bool:
+        """Check whether an environment exists for user"""
+        env_doc = await self.db.environments.find_one(
+            {"_id": env_id, "user_id": user_id}, {"_id": 1}
+        )
+        return env_doc is not None
+
     async def start_environment(self, env_id: str, user_id: str) -> bool:
         """Start a stopped environment"""
         try:
-            environment = await self.get_environment(env_id, user_id)
-            if not environment:
-                return False
+            env_doc = await self._transition_status(
+                env_id, user_id, EnvironmentStatus.STOPPED, EnvironmentStatus.RUNNING
+            )
+            if not env_doc:
+                if not await self._environment_exists(env_id, user_id):
+                    return False
 
-            if environment.status != EnvironmentStatus.STOPPED:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Environment is not in stopped state",
                 )
 
-            # Update status
-            await self.db.environments.update_one(
-                {"_id": env_id}, {"$set": {"status": EnvironmentStatus.RUNNING.value}}
-            )
-
-            logger.info(f"Environment started: {environment.name}")
+            logger.info("Environment started", environment_name=env_doc["name"])
             return True
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error starting environment: {e}")
+            logger.error("Error starting environment", error=str(e))
             return False
 
     async def stop_environment(self, env_id: str, user_id: str) -> bool:
         """Stop a running environment"""
         try:
-            environment = await self.get_environment(env_id, user_id)
-            if not environment:
-                return False
+            env_doc = await self._transition_status(
+                env_id, user_id, EnvironmentStatus.RUNNING, EnvironmentStatus.STOPPED
+            )
+            if not env_doc:
+                if not await self._environment_exists(env_id, user_id):
+                    return False
 
-            if environment.status != EnvironmentStatus.RUNNING:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Environment is not running",
                 )
 
-            # Update status
-            await self.db.environments.update_one(
-                {"_id": env_id}, {"$set": {"status": EnvironmentStatus.STOPPED.value}}
-            )
-
-            logger.info(f"Environment stopped: {environment.name}")
+            logger.info("Environment stopped", environment_name=env_doc["name"])
             return True
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error stopping environment: {e}")
+            logger.error("Error stopping environment", error=str(e))
             return False
 
     async def create_websocket_session(
@@ -325,11 +465,11 @@ class EnvironmentService:
             # Store in memory for quick access
             self.active_sessions[connection_id] = session
 
-            logger.info(f"WebSocket session created: {connection_id}")
+            logger.info("WebSocket session created", connection_id=connection_id)
             return session
 
         except Exception as e:
-            logger.error(f"Error creating WebSocket session: {e}")
+            logger.error("Error creating WebSocket session", error=str(e))
             raise
 
     async def remove_websocket_session(self, connection_id: str):
@@ -344,19 +484,99 @@ class EnvironmentService:
                 {"connection_id": connection_id}
             )
 
-            logger.info(f"WebSocket session removed: {connection_id}")
+            logger.info("WebSocket session removed", connection_id=connection_id)
+
+        except Exception as e:
+            logger.error("Error removing WebSocket session", error=str(e))
+
+    async def remove_websocket_sessions(self, connection_ids: List[str]):
+        """Remove many WebSocket sessions in bounded $in batches"""
+        try:
+            for i in range(0, len(connection_ids), SESSION_DELETE_BATCH_SIZE):
+                batch = connection_ids[i : i + SESSION_DELETE_BATCH_SIZE]
+
+                for connection_id in batch:
+                    self.active_sessions.pop(connection_id, None)
+
+                await self.db.websocket_sessions.delete_many(
+                    {"connection_id": {"$in": batch}}
+                )
+
+            logger.info("WebSocket sessions removed", count=len(connection_ids))
 
         except Exception as e:
-            logger.error(f"Error removing WebSocket session: {e}")
+            logger.error("Error removing WebSocket sessions", error=str(e))
 
     async def record_metrics(self, env_id: str, metrics: EnvironmentMetrics):
-        """Record environment metrics"""
+        """Record environment metrics (buffered, flushed in batches)"""
+        self._metrics_buffer.append(metrics.model_dump())
+
+        if len(self._metrics_buffer) >= METRICS_FLUSH_BATCH_SIZE:
+            await self.flush_metrics()
+        else:
+            self._schedule_metrics_flush()
+
+    def _schedule_metrics_flush(self):
+        """Arm the interval flush unless one is already pending"""
+        task = self._metrics_flush_task
+        # The running flush task counts as finished when it re-arms itself
+        if task is None or task.done() or task is asyncio.current_task():
+            self._metrics_flush_task = asyncio.create_task(
+                self._flush_metrics_after_interval()
+            )
+
+    async def _cancel_metrics_flush(self):
+        """Cancel and await the pending interval flush, if any"""
+        task, self._metrics_flush_task = self._metrics_flush_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _flush_metrics_after_interval(self):
+        """Flush buffered metrics once the flush interval has elapsed"""
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        await self.flush_metrics()
+
+    async def flush_metrics(self):
+        """Write all buffered metrics with a single insert_many"""
+        if not self._metrics_buffer:
+            return
+
+        buffer, self._metrics_buffer = self._metrics_buffer, []
         try:
-            metrics_dict = metrics.dict()
-            await self.db.environment_metrics.insert_one(metrics_dict)
+            await self.db.environment_metrics.insert_many(buffer, ordered=False)
 
+        except BulkWriteError as e:
+            # Unordered insert: the rest of the batch was written, and the
+            # rejected documents would fail again, so they are not retried
+            logger.error(
+                "Error recording metrics",
+                error=str(e),
+                dropped=len(e.details.get("writeErrors", [])),
+            )
         except Exception as e:
-            logger.error(f"Error recording metrics: {e}")
+            # Put the batch back for the next flush, dropping the oldest
+            # samples beyond the buffer cap
+            self._metrics_buffer[:0] = buffer
+            dropped = max(len(self._metrics_buffer) - METRICS_BUFFER_MAX_SIZE, 0)
+            del self._metrics_buffer[:dropped]
+            logger.error(
+                "Error recording metrics",
+                error=str(e),
+                requeued=max(len(buffer) - dropped, 0),
+                dropped=dropped,
+            )
+            self._schedule_metrics_flush()
+
+    async def close_metrics(self):
+        """Cancel the pending interval flush and write out buffered metrics"""
+        await self._cancel_metrics_flush()
+        await self.flush_metrics()
+        # Don't leave a retry armed by a failed final flush
+        await self._cancel_metrics_flush()
 
 
 # Global environment service instance
@@ -81,7 +81,14 @@ db.createCollection('environments', {
 });
 
 db.createCollection('websocket_sessions');
-db.createCollection('environment_metrics');
+db.createCollection('environment_metrics', {
+  timeseries: {
+    timeField: 'timestamp',
+    metaField: 'environment_id',
+    granularity: 'seconds'
+  },
+  expireAfterSeconds: 2592000 // 30 days retention
+});
 
 // Create indexes
 db.users.createIndex({ 'email': 1 }, { unique: true });
@@ -96,7 +103,6 @@ db.websocket_sessions.createIndex({ 'user_id': 1 });
 db.websocket_sessions.createIndex({ 'environment_id': 1 });
 db.websocket_sessions.createIndex({ 'connection_id': 1 }, { unique: true });
 
-db.environment_metrics.createIndex({ 'environment_id': 1, 'timestamp': 1 });
-db.environment_metrics.createIndex({ 'timestamp': 1 }, { expireAfterSeconds: 2592000 }); // 30 days TTL
+db.environment_metrics.createIndex({ 'environment_id': 1, 'timestamp': -1 });
 
 print('MongoDB initialization completed successfully');
\ No newline at end of file
@@ -1,9 +1,6 @@
 #!/usr/bin/env python3
 
 import asyncio
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.models.user import UserCreate, UserInDB
 from app.core.database import get_database
@@ -6,7 +6,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.main import app
 from app.core.config import settings
-from app.core.database import Database, get_database
+from app.core.database import Database, create_indexes, get_database
 
 
 # Test database configuration
@@ -34,7 +34,7 @@ async def test_database():
     database.db = db
     
     # Create indexes
-    await database.create_indexes()
+    await create_indexes(db)
     
     yield database
     
@@ -63,13 +63,14 @@ async def client(test_database: Database) -> AsyncGenerator[AsyncClient, None]:
 @pytest.fixture
 async def clean_database(test_database: Database):
     """Clean test database before each test."""
-    # Drop all collections
+    # Drop all collections concurrently
     collections = await test_database.db.list_collection_names()
-    for collection_name in collections:
-        await test_database.db[collection_name].drop()
+    await asyncio.gather(
+        *(test_database.db[collection_name].drop() for collection_name in collections)
+    )
     
     # Recreate indexes
-    await test_database.create_indexes()
+    await create_indexes(test_database.db)
     
     yield test_database
     
@@ -0,0 +1,120 @@
+import base64
+import pytest
+from datetime import datetime, timedelta
+
+from app.models.cluster import ClusterCreate, ClusterRegion, ClusterStatus
+from app.services.cluster_service import cluster_service, CLUSTER_SENSITIVE_FIELDS
+
+
+KUBE_CONFIG = base64.b64encode(b"""
+apiVersion: v1
+clusters:
+- cluster:
+    server: https://k8s.example.com
+  name: test
+contexts:
+- context:
+    cluster: test
+    user: test
+  name: test
+current-context: test
+users:
+- name: test
+  user:
+    token: test-token
+""").decode()
+
+
+@pytest.fixture
+async def clusters(clean_database):
+    """Cluster service bound to the clean test database."""
+    cluster_service.set_database(clean_database.db)
+    return cluster_service
+
+
+def cluster_data(name, is_default=False, region=ClusterRegion.US_EAST):
+    """Build a cluster creation payload."""
+    return ClusterCreate(
+        name=name,
+        region=region,
+        endpoint="https://k8s.example.com",
+        is_default=is_default,
+        kube_config=KUBE_CONFIG,
+    )
+
+
+class TestClusterService:
+    """Test cluster service database behaviour."""
+
+    async def test_create_duplicate_name_rejected(self, clusters, clean_database):
+        """Test that a duplicate name is rejected and keeps the regional default."""
+        await clusters.create_cluster(cluster_data("primary", is_default=True), "admin")
+
+        with pytest.raises(ValueError, match="already exists"):
+            await clusters.create_cluster(cluster_data("primary", is_default=True), "admin")
+
+        assert await clean_database.db.clusters.count_documents({"name": "primary"}) == 1
+        existing_doc = await clean_database.db.clusters.find_one({"name": "primary"})
+        assert existing_doc["is_default"] is True
+
+    async def test_create_default_unsets_previous_default(self, clusters, clean_database):
+        """Test that a new default cluster replaces the region's previous default."""
+        await clusters.create_cluster(cluster_data("primary", is_default=True), "admin")
+        await clusters.create_cluster(cluster_data("secondary", is_default=True), "admin")
+
+        previous_doc = await clean_database.db.clusters.find_one({"name": "primary"})
+        current_doc = await clean_database.db.clusters.find_one({"name": "secondary"})
+        assert previous_doc["is_default"] is False
+        assert current_doc["is_default"] is True
+
+    async def test_list_clusters_filters_by_region_newest_first(self, clusters, clean_database):
+        """Test that listings filter by region and sort newest first."""
+        await clusters.create_cluster(cluster_data("east-old"), "admin")
+        await clusters.create_cluster(cluster_data("east-new"), "admin")
+        await clusters.create_cluster(cluster_data("west", region=ClusterRegion.US_WEST), "admin")
+
+        # Spread creation times so the sort order is unambiguous
+        now = datetime.utcnow()
+        await clean_database.db.clusters.update_one(
+            {"name": "east-old"}, {"$set": {"created_at": now - timedelta(hours=1)}}
+        )
+        await clean_database.db.clusters.update_one(
+            {"name": "east-new"}, {"$set": {"created_at": now}}
+        )
+
+        listed = await clusters.list_clusters(ClusterRegion.US_EAST)
+
+        assert [cluster.name for cluster in listed] == ["east-new", "east-old"]
+        assert len(await clusters.list_clusters()) == 3
+
+    async def test_list_clusters_converts_ids(self, clusters, clean_database):
+        """Test that listed clusters carry string ids and no sensitive fields."""
+        await clusters.create_cluster(cluster_data("primary"), "admin")
+        stored = await clean_database.db.clusters.find_one({"name": "primary"})
+
+        (listed,) = await clusters.list_clusters()
+
+        assert listed.id == str(stored["_id"])
+        assert CLUSTER_SENSITIVE_FIELDS.isdisjoint(listed.model_dump())
+
+    async def test_available_regions(self, clusters, clean_database):
+        """Test per-region cluster counts and default detection."""
+        await clusters.create_cluster(cluster_data("east-default", is_default=True), "admin")
+        await clusters.create_cluster(cluster_data("east-spare"), "admin")
+        await clusters.create_cluster(cluster_data("west", region=ClusterRegion.US_WEST), "admin")
+        await clusters.create_cluster(cluster_data("europe", region=ClusterRegion.EU_CENTRAL), "admin")
+
+        # Inactive clusters don't count towards availability
+        await clean_database.db.clusters.update_one(
+            {"name": "europe"}, {"$set": {"status": ClusterStatus.INACTIVE.value}}
+        )
+
+        regions = {info["region"]: info for info in await clusters.get_available_regions()}
+
+        assert set(regions) == {region.value for region in ClusterRegion}
+        assert regions["us-east"]["cluster_count"] == 2
+        assert regions["us-east"]["has_default"] is True
+        assert regions["us-west"]["cluster_count"] == 1
+        assert regions["us-west"]["has_default"] is False
+        assert regions["eu-central"]["available"] is False
+        assert regions["asia-pacific"]["cluster_count"] == 0
@@ -1,6 +1,13 @@
+import asyncio
 import pytest
+from bson import ObjectId
+from datetime import datetime
+from fastapi import HTTPException
 from httpx import AsyncClient
 
+from app.models.environment import EnvironmentStatus
+from app.services.environment_service import environment_service
+
 
 class TestEnvironmentEndpoints:
     """Test environment management endpoints."""
@@ -186,4 +193,111 @@ class TestEnvironmentEndpoints:
         # Should contain metrics structure
         assert "cpu_usage" in data
         assert "memory_usage" in data
-        assert "storage_usage" in data
\ No newline at end of file
+        assert "storage_usage" in data
+
+
+@pytest.fixture
+async def env_service(clean_database):
+    """Environment service bound to the clean test database."""
+    environment_service.set_database(clean_database.db)
+    environment_service._environment_cache.clear()
+    yield environment_service
+    environment_service._environment_cache.clear()
+
+
+async def insert_environment(db, user_id, status=EnvironmentStatus.STOPPED):
+    """Insert an environment document directly and return its ObjectId."""
+    now = datetime.utcnow()
+    result = await db.environments.insert_one({
+        "user_id": user_id,
+        "name": "test-env",
+        "template": "python",
+        "status": status.value,
+        "resources": {"cpu": "500m", "memory": "1Gi", "storage": "5Gi"},
+        "created_at": now,
+        "updated_at": now,
+    })
+    return result.inserted_id
+
+
+class TestEnvironmentService:
+    """Test environment service state handling against the database."""
+    
+    user_id = "507f1f77bcf86cd799439011"
+    
+    async def test_delete_removes_document(self, env_service, clean_database):
+        """Test that deleting an environment removes its document."""
+        env_id = await insert_environment(clean_database.db, self.user_id)
+        
+        assert await env_service.delete_environment(env_id, self.user_id)
+        await asyncio.gather(*env_service._background_tasks)
+        
+        assert await clean_database.db.environments.find_one({"_id": env_id}) is None
+    
+    async def test_stop_invalidates_cached_environment(self, env_service, clean_database):
+        """Test that a GET right after a stop sees the stopped status."""
+        env_id = await insert_environment(clean_database.db, self.user_id, EnvironmentStatus.RUNNING)
+        
+        # Populate the cache with the running environment
+        environment = await env_service.get_environment(env_id, self.user_id)
+        assert environment.status == EnvironmentStatus.RUNNING
+        
+        assert await env_service.stop_environment(env_id, self.user_id)
+        
+        environment = await env_service.get_environment(env_id, self.user_id)
+        assert environment.status == EnvironmentStatus.STOPPED
+    
+    async def test_delete_invalidates_cached_environment(self, env_service, clean_database):
+        """Test that a GET after a completed delete finds nothing."""
+        env_id = await insert_environment(clean_database.db, self.user_id)
+        
+        # Populate the cache before deleting
+        assert await env_service.get_environment(env_id, self.user_id) is not None
+        
+        assert await env_service.delete_environment(env_id, self.user_id)
+        
+        # The simulated teardown delay keeps the document around, so this
+        # read re-caches the terminated environment
+        environment = await env_service.get_environment(env_id, self.user_id)
+        assert environment.status == EnvironmentStatus.TERMINATED
+        
+        await asyncio.gather(*env_service._background_tasks)
+        
+        # The route turns a missing environment into a 404
+        assert await env_service.get_environment(env_id, self.user_id) is None
+    
+    async def test_cache_is_keyed_per_user(self, env_service, clean_database):
+        """Test that a cached environment is not served to another user."""
+        env_id = await insert_environment(clean_database.db, self.user_id)
+        
+        # Populate the cache for the owner
+        assert await env_service.get_environment(env_id, self.user_id) is not None
+        
+        other_user_id = "507f1f77bcf86cd799439012"
+        assert await env_service.get_environment(env_id, other_user_id) is None
+    
+    async def test_start_running_environment_rejected(self, env_service, clean_database):
+        """Test that starting a running environment is a 400."""
+        env_id = await insert_environment(clean_database.db, self.user_id, EnvironmentStatus.RUNNING)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await env_service.start_environment(env_id, self.user_id)
+        
+        assert exc_info.value.status_code == 400
+    
+    async def test_stop_stopped_environment_rejected(self, env_service, clean_database):
+        """Test that stopping a stopped environment is a 400."""
+        env_id = await insert_environment(clean_database.db, self.user_id, EnvironmentStatus.STOPPED)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await env_service.stop_environment(env_id, self.user_id)
+        
+        assert exc_info.value.status_code == 400
+    
+    async def test_transition_unknown_environment(self, env_service, clean_database):
+        """Test that start/stop on an unknown id report not found."""
+        unknown_id = ObjectId()
+        
+        # The routes turn False into a 404
+        assert await env_service.start_environment(unknown_id, self.user_id) is False
+        assert await env_service.stop_environment(unknown_id, self.user_id) is False